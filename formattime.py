@@ -41,8 +41,28 @@ Functions:
   _HandleTimeZone: Return offset and offset seconds tuple from the local to utc.
   ToUTC:          Format date/time like string to UTC time string
                   in RFC 3339 format.
+  EnableSlowInputCapture: Record the conversions slower than a threshold.
+  DisableSlowInputCapture: Stop recording slow conversions.
+  GetSlowInputs:  Return the recorded slow conversions.
+  ToRFC3339:      Normalize a well formatted time string keeping its
+                  fraction and offset, without datetime conversion.
   ToLocal         Format date/time like string to Local time string
                   in RFC 3339 format.
+  RegisterLocale: Add month/weekday names and AM/PM markers of a locale.
+  ToUTCStrict:    Format date/time like string to UTC time string, reporting
+                  failures as error codes.
+  ToLocalStrict:  Same as ToUTCStrict using Local time.
+  ToUTCBatch:     Format a sequence of date/time like strings to UTC.
+  ToUTCBuffer:    Format date/time strings held in one byte buffer to UTC.
+  ToEpochBatch:   Convert date/time like strings to UTC microseconds since
+                  the epoch plus a validity bitmap.
+  ToArrow:        Convert date/time like strings to a pyarrow timestamp
+                  array in UTC.
+
+Classes:
+  StreamConverter: Format a stream of date/time strings to UTC, reparsing
+                   only what changed since the previous string.
+  Profile:        cProfile/tracemalloc profiling around conversions.
 """
 
 
@@ -54,15 +74,138 @@ __VERSION__ = '0.5'
 from datetime import datetime
 from datetime import timedelta
 from dateutil import parser
+from dateutil import tz
+import array
 import iso8601
 import os
 import pytz
 import re
+import sys
+import threading
 import time
 
+try:
+  import pyarrow
+except ImportError:
+  pyarrow = None
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+try:
+  import cProfile
+  import pstats
+except ImportError:
+  cProfile = None
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
 _DAYS_IN_YEAR = 365
 _DAYS_OF_MONTH = 30
 
+# regex of the well formatted time string, see _MatchFullTime. The regexes
+# used with pattern.match(data, start, end) have no '^', which would never
+# match for start > 0; match() anchors at start already. They end with '\Z'
+# rather than '$', which also matches before a trailing newline.
+_CLOCK_FORMAT = r'([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])'
+_FULLTIME_FORMAT = \
+    r'([0-9]{4})-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])' \
+    r'T' + _CLOCK_FORMAT + r'(\.[0-9]{1,6}?)?' \
+    r'(Z|([+-])([01][0-9]|2[0-3]):([0-5][0-9]))?\Z'
+_FULLTIME_RE = re.compile(_FULLTIME_FORMAT)
+# the clock and fraction of a well formatted time string, see StreamConverter.
+_CLOCK_RE = re.compile(_CLOCK_FORMAT + r'(?:\.[0-9]{1,6})?')
+_DATE_WIDTH = 11   # len('yyyy-mm-ddT')
+_CLOCK_WIDTH = 8   # len('HH:MM:SS')
+
+# regex of the compact numeric (iCal like) time string in local time:
+# yyyymmdd[THHMMSS]
+_NUMERIC_RE = re.compile(
+    r'([0-9]{4})(0[1-9]|1[0-2])(0[1-9]|[12][0-9]|3[01])'
+    r'(?:T([01][0-9]|2[0-3])([0-5][0-9])([0-5][0-9]))?\Z')
+
+_UTC_FORMAT = '%04d-%02d-%02dT%02d:%02d:%02d.000Z'
+_UTC_WIDTH = 24  # len() of a string rendered with _UTC_FORMAT
+_UTC_PRECISE_FORMAT = '%04d-%02d-%02dT%02d:%02d:%02d%sZ'
+_DAYS_OF_MONTHS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_EPOCH = datetime(1970, 1, 1)
+
+# formatted midnight of dates, see _FormatDate. The supported years
+# 1970-2038 hold about 25,000 dates, the size leaves room for a second
+# local offset after a DST switch.
+_DATE_TABLE = {}
+_DATE_TABLE_SIZE = 65536
+
+# compiled _HandleTime formats keyed by the date and time delimiters, and
+# the positions of the date-only ones tried by _HandleDate.
+_HANDLE_TIME_FORMATS = {}
+_DATE_ONLY_FORMATS = (0, 7, 8, 9, 10)
+
+# slow input capture, see EnableSlowInputCapture. _state.path is the
+# resolution path of the conversion running in the current thread, set by
+# _ConvertTime. _slow_lock guards the ring buffer.
+_state = threading.local()
+_slow_lock = threading.Lock()
+_slow_threshold = None
+_slow_inputs = []
+_slow_size = 0
+_slow_next = 0
+
+# error codes of the strict conversions, see ToUTCStrict.
+ERROR_NONE = 0
+ERROR_EMPTY = 1           # empty string
+ERROR_TOO_LONG = 2        # longer than _STRICT_MAX_LENGTH
+ERROR_BAD_CHARACTER = 3   # character never used in date/time strings
+ERROR_UNKNOWN_WORD = 4    # word is not a known name or keyword
+ERROR_NO_MATCH = 5        # no supported format matches
+ERROR_INVALID_DATE = 6    # fields do not form a valid date/time
+ERROR_YEAR_RANGE = 7      # year out of the supported range
+
+_STRICT_MAX_LENGTH = 64
+_STRICT_BAD_CHARACTER_RE = re.compile(r'[^\w\s,.:+\-/\\]', re.U)
+_STRICT_WORD_RE = re.compile(r'[^\W\d_]+', re.U)
+_STRICT_WORDS = set(['now', 'today', 'tomorrow', 'yesterday',
+                     'st', 'nd', 'rd', 'th', 'gmt', 'ut', 'utc'])
+_STRICT_YEARS = (1970, 2038)
+
+# name tries of the registered locales, see RegisterLocale. The locales are
+# tried in _LOCALE_ORDER.
+_LOCALES = {}
+_LOCALE_ORDER = []
+_MONTHS, _WEEKDAYS, _AM_PM = range(3)
+_TRIE_END = ''        # trie key of the value of a complete name
+_TRIE_VALUES = None   # trie key of the values of all names below a node
+_NAME_PREFIX_MIN = 3  # shortest prefix accepted for a name, such as 'Sep'
+
+# regexes of the date/time strings containing month/weekday names, see
+# _HandleNames.
+_NAME_TIME = \
+    r'(?:,?\s+(?P<H>[01]?[0-9]|2[0-3])' \
+    r'(?::(?P<M>[0-5][0-9])(?::(?P<S>[0-5][0-9]))?)?)?' \
+    r'(?:\s*(?P<p>[^\W\d_]\.?[^\W\d_]\.?))?'
+_NAME_WEEKDAY = r'(?:(?P<w>[^\W\d_]+)\.?,?\s+)?'
+_NAME_FORMATS = (
+    # (weekday,month,d,y,H,M,S) such as 'Mar 30, 2008', 'Sun March 30th'
+    re.compile(r'^' + _NAME_WEEKDAY +
+               r'(?P<n>[^\W\d_]+)\.?\s+(?P<d>0?[1-9]|[12][0-9]|3[01])'
+               r'(?:st|nd|rd|th)?(?:,?\s+(?P<y>[0-9]{4}))?' +
+               _NAME_TIME + r'$', re.U | re.I),
+    # (weekday,d,month,y,H,M,S) such as '30 March 2008 11:30 pm'
+    re.compile(r'^' + _NAME_WEEKDAY +
+               r'(?P<d>0?[1-9]|[12][0-9]|3[01])(?:st|nd|rd|th)?\s+'
+               r'(?P<n>[^\W\d_]+)\.?(?:,?\s+(?P<y>[0-9]{4}))?' +
+               _NAME_TIME + r'$', re.U | re.I),
+    # (H,M,S) with AM/PM marker such as '11:30 am', '9pm'
+    re.compile(r'^(?P<H>[01]?[0-9]|2[0-3])'
+               r'(?::(?P<M>[0-5][0-9])(?::(?P<S>[0-5][0-9]))?)?'
+               r'\s*(?P<p>[^\W\d_]\.?[^\W\d_]\.?)$', re.U),
+)
+
 
 def _MatchFullTime(time_str, debug=0):
   """Check whether or not a time string is already formatted well.
@@ -99,14 +242,343 @@ def _MatchFullTime(time_str, debug=0):
   # <00-59 of minutes><sep :><00-59 of seconds>[optional .<6 digits>]
   # <optional either Z|<00-23 of hours><sep :><00-59 of minutes>>
 
-  m = r'^([0-9]{4})-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])' \
-      r'T([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])(\.[0-9]{1,6}?)?' \
-      r'(Z|([+-])([01][0-9]|2[0-3]):([0-5][0-9]))?$'
-  if debug: print 'using %s to match %s' % (m, time_str)
-  if re.match(m, time_str):
+  if debug: print 'using %s to match %s' % (_FULLTIME_FORMAT, time_str)
+  if _FULLTIME_RE.match(time_str):
     return iso8601.parse_date(time_str)
   return
 
+
+def _AsString(data):
+  """Return a str for a buffer-like date/time input.
+
+  Args:
+    data: a str, unicode or buffer-like object (buffer, bytearray,
+      memoryview).
+
+  Returns:
+    data itself if it is already a string, otherwise its bytes as a str.
+  """
+  if isinstance(data, basestring):
+    return data
+  if hasattr(data, 'tobytes'):
+    return data.tobytes()
+  return str(data)
+
+
+def _AsBuffer(data):
+  """Return an object the re module can match on without copying data.
+
+  Args:
+    data: a str, unicode or buffer-like object (buffer, bytearray,
+      memoryview).
+
+  Returns:
+    data itself if it is already a string, a buffer over it otherwise.
+    memoryview does not support the buffer interface re needs so it is
+    copied once.
+  """
+  if isinstance(data, basestring):
+    return data
+  if hasattr(data, 'tobytes'):
+    return data.tobytes()
+  return buffer(data)
+
+
+def _SplitFullTime(data, start=0, end=None):
+  """Split a well formatted time string into its fields without loss.
+
+  Args:
+    data: a str or buffer object holding the date/time string.
+    start: offset of the first character of the string in data.
+    end: offset one past the last character, default to len(data).
+
+  Returns:
+    A tuple of year, month, day, hour, minute, second, microsecond and the
+    offset in minutes east of UTC, the offset is None for 'Z' or no offset.
+    None if the string is not well formatted. The day is not checked
+    against the month.
+  """
+  if end is None:
+    end = len(data)
+  m = _FULLTIME_RE.match(data, start, end)
+  if not m:
+    return
+  fields = [int(g) for g in m.groups()[:6]]
+  microsecond = 0
+  if m.group(7):
+    microsecond = int(m.group(7)[1:].ljust(6, '0'))
+  offset = None
+  if m.group(9):
+    offset = int(m.group(10)) * 60 + int(m.group(11))
+    if m.group(9) == '-':
+      offset = -offset
+  return tuple(fields) + (microsecond, offset)
+
+
+def _FormatFraction(microsecond):
+  """Format microseconds as '.mmm', or '.uuuuuu' if they need it."""
+  if microsecond % 1000:
+    return '.%06d' % microsecond
+  return '.%03d' % (microsecond // 1000)
+
+
+def _ValidDate(year, month, day):
+  """True if year, month and day form a date datetime supports."""
+  if year < 1:
+    return False
+  if month == 2 and day == 29:
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+  return day <= _DAYS_OF_MONTHS[month - 1]
+
+
+def _FastParse(data, start=0, end=None):
+  """Parse the well formatted and compact numeric time strings directly.
+
+  The well formatted layout is described in _MatchFullTime, the compact
+  numeric one is yyyymmdd[THHMMSS] in local time. Both are parsed with
+  one regex match and without the help of iso8601 or dateutil. The local
+  time is converted with tzlocal like _ConvertTime does for dateutil
+  results, years before 1900 are left to the slow path.
+
+  Args:
+    data: a str or buffer object holding the date/time string.
+    start: offset of the first character of the string in data.
+    end: offset one past the last character, default to len(data).
+
+  Returns:
+    A naive datetime object in UTC, keeping the microseconds.
+    None if the string is not in either layout or not a valid date.
+  """
+  if end is None:
+    end = len(data)
+
+  fields = _SplitFullTime(data, start, end)
+  if fields:
+    offset = fields[7] or 0
+    try:
+      return datetime(*fields[:7]) - timedelta(minutes=offset)
+    except (ValueError, OverflowError):
+      return
+
+  m = _NUMERIC_RE.match(data, start, end)
+  if m:
+    fields = [int(g or 0) for g in m.groups()]
+    if fields[0] < 1900:
+      return
+    try:
+      dt = datetime(*fields).replace(tzinfo=tz.tzlocal())
+      return dt.astimezone(pytz.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError):
+      return
+  return
+
+
+def _FastUTC(data, start=0, end=None, precise=0):
+  """Format a well formatted or compact numeric time string to UTC.
+
+  Args:
+    data: a str or buffer object holding the date/time string.
+    start: offset of the first character of the string in data.
+    end: offset one past the last character, default to len(data).
+    precise: keep the fraction of seconds instead of writing '.000'.
+
+  Returns:
+    A well formatted time string using UTC datetime.
+    None if _FastParse can not handle the string.
+  """
+  t_obj = _FastParse(data, start, end)
+  if t_obj is None:
+    return
+  if precise:
+    return _UTC_PRECISE_FORMAT % (t_obj.year, t_obj.month, t_obj.day,
+                                  t_obj.hour, t_obj.minute, t_obj.second,
+                                  _FormatFraction(t_obj.microsecond))
+  return _UTC_FORMAT % (t_obj.year, t_obj.month, t_obj.day,
+                        t_obj.hour, t_obj.minute, t_obj.second)
+
+
+def _AsUnicode(time_str):
+  """Return a date/time string as unicode, decoding a str as UTF-8.
+
+  Returns:
+    The unicode string, None if a str is not valid UTF-8.
+  """
+  if isinstance(time_str, unicode):
+    return time_str
+  try:
+    return time_str.decode('utf-8')
+  except UnicodeDecodeError:
+    return
+
+
+def _BuildTrie(names, first=0):
+  """Build a case-insensitive trie mapping names to their positions.
+
+  Args:
+    names: a sequence of names. An item can also be a sequence of
+      alternative names sharing the same position.
+    first: the value of the first position.
+
+  Returns:
+    The root node of the trie. A node is a dictionary of the next
+    characters to child nodes, plus the value of the name ending at the node
+    under _TRIE_END and the set of values below the node under
+    _TRIE_VALUES.
+  """
+  root = {_TRIE_VALUES: set()}
+  for value, alternatives in enumerate(names):
+    if isinstance(alternatives, basestring):
+      alternatives = (alternatives,)
+    for name in alternatives:
+      node = root
+      node[_TRIE_VALUES].add(value + first)
+      for c in _AsUnicode(name).lower():
+        node = node.setdefault(c, {_TRIE_VALUES: set()})
+        node[_TRIE_VALUES].add(value + first)
+      node[_TRIE_END] = value + first
+  return root
+
+
+def _LookupName(kind, word):
+  """Look up a month/weekday name or AM/PM marker in the registered locales.
+
+  A complete name matches, so does a prefix of at least _NAME_PREFIX_MIN
+  characters if it belongs to one name only. Dots are ignored so 'a.m.'
+  is the same as 'am'.
+
+  Args:
+    kind: one of _MONTHS, _WEEKDAYS and _AM_PM.
+    word: the word to look up.
+
+  Returns:
+    The month (1-12), the weekday (0 for Monday) or the marker (0 for AM).
+    None if the word is not known in any locale.
+  """
+  word = _AsUnicode(word)
+  if word is None:
+    return
+  word = word.replace(u'.', u'').lower()
+  for locale in _LOCALE_ORDER:
+    node = _LOCALES[locale][kind]
+    for c in word:
+      node = node.get(c)
+      if node is None:
+        break
+    else:
+      if _TRIE_END in node:
+        return node[_TRIE_END]
+      if len(word) >= _NAME_PREFIX_MIN and len(node[_TRIE_VALUES]) == 1:
+        return list(node[_TRIE_VALUES])[0]
+  return
+
+
+def RegisterLocale(name, months, weekdays, am_pm=('am', 'pm')):
+  """Register month/weekday names and AM/PM markers of a locale.
+
+  The names are matched case-insensitively, an unambiguous prefix such as
+  'Sept' or 'Tues' matches as well. Locales are tried in the order they
+  were registered, 'en' is registered by default. Names and input given
+  as str are decoded as UTF-8, so non-ASCII names match either str or
+  unicode input.
+
+  Args:
+    name: name of the locale, registering an existing name replaces it.
+    months: 12 month names starting with January.
+    weekdays: 7 weekday names starting with Monday.
+    am_pm: the ante meridiem and post meridiem markers.
+
+  Any name can also be given as a sequence of alternative names.
+  """
+  _LOCALES[name] = (_BuildTrie(months, 1), _BuildTrie(weekdays),
+                    _BuildTrie(am_pm))
+  if name not in _LOCALE_ORDER:
+    _LOCALE_ORDER.append(name)
+
+
+RegisterLocale('en',
+               ('January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November',
+                'December'),
+               ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                'Saturday', 'Sunday'))
+
+
+def _HandleNames(time_str, debug=0):
+  """Extract date/time elements from a string with month/weekday names.
+
+  Handles strings such as 'Mar 30, 2008', 'Sunday, 30 March 2008 11:30 pm'
+  and '11:30 am' without the help of dateutil. The year defaults to the
+  current one, the weekday is checked to be a known name but not used.
+  The formats are tried in turn until the names of one are known, so '9 pm'
+  is not taken for a day and a month. A str is decoded as UTF-8.
+
+  Args:
+    time_str: a string will be checked on.
+    debug: debug level.
+
+  Returns:
+    a dictionary containing date/time elements like _HandleTime does.
+    None if the string is not in one of these formats.
+  """
+  time_str = _AsUnicode(time_str)
+  if time_str is None:
+    return
+  for v in _NAME_FORMATS:
+    if debug: print 'using u"%s" to match %s' % (v.pattern, time_str)
+    m = v.match(time_str)
+    if m:
+      match = _MatchNames(m)
+      if match is not None:
+        return match
+  return
+
+
+def _MatchNames(m):
+  """Look up the names of a _NAME_FORMATS match.
+
+  Args:
+    m: the match object.
+
+  Returns:
+    a dictionary containing date/time elements like _HandleTime does.
+    None if a name or marker is not known.
+  """
+  match = {}
+  groups = m.groupdict()
+  if groups.get('w') and _LookupName(_WEEKDAYS, groups['w']) is None:
+    return
+  if groups.get('n'):
+    match['month'] = _LookupName(_MONTHS, groups['n'])
+    if match['month'] is None:
+      return
+    match['day'] = int(groups['d'])
+  if groups.get('y'):
+    match['year'] = int(groups['y'])
+
+  if groups['H'] is not None:
+    hour = int(groups['H'])
+    if groups['p']:
+      marker = _LookupName(_AM_PM, groups['p'])
+      if marker is None or not 1 <= hour <= 12:
+        return
+      hour = hour % 12 + marker * 12
+    elif groups['M'] is None:
+      # a bare number after the date is ambiguous, leave it to dateutil.
+      return
+    match['hour'] = hour
+    match['minute'] = int(groups['M'] or 0)
+    match['second'] = int(groups['S'] or 0)
+  elif groups['p']:
+    return
+  return match
+
+
+def _Epoch(t_obj):
+  """Return the microseconds since the epoch of a naive UTC datetime."""
+  delta = t_obj - _EPOCH
+  return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
 def _GetDelimiter(time_str, date_delimiter, time_delimiter):
   """Given a time string, find out the actual delimiter regex format.
 
@@ -133,33 +605,24 @@ def _GetDelimiter(time_str, date_delimiter, time_delimiter):
   return date_delimiter, time_delimiter
 
 
-def _HandleTime(time_str, debug=0):
-  """Function to extract out possible date/time elements from a datetime like
-  string.
+def _BuildTimeFormats(dd, td):
+  """Compile the formats _HandleTime tries for the given delimiters.
 
   Args:
-    time_str: a string will be checked on.
-    debug: debug level.
+    dd: regex for date delimiter, see _GetDelimiter.
+    td: regex for time delimiter, see _GetDelimiter.
 
   Returns:
-    a dictionary containing date/time elements.
-
-  Raises:
-    ValueError, when the passed in string isn't a date/time like string.
+    a tuple of compiled regexes in the order they are tried.
   """
-  match = {}
   my = r'(?P<y>[0-9]{2,4})'               # regex for year
   mm = r'(?P<m>0?[1-9]|1[0-2])'           # regex for month
   md = r'(?P<d>0?[1-9]|[12][0-9]|3[01])'  # regex for day
   mH = r'(?P<H>[01]?[0-9]|2[0-3])'        # regex for hour
   mM = r'(?P<M>[0-5]?[0-9])'              # regex for minutes
   mS = r'(?P<S>[0-5]?[0-9]|60)'           # regex for seconds
-  dd = r'[-\\\\/]?'                        # regex for date delimiter
-  td = r':?'                               # regex for time delimiter
   other = r'[ Tt]'                         # regex for all other stuff
 
-  dd, td = _GetDelimiter(time_str, dd, td)
-
   formats = (
     r'^'+mm+dd+md+r'$',                             # (m,d)
     r'^'+my+dd+mm+dd+md+other+mH+td+mM+td+mS+r'$',  # (y,m,d,H,M,S)
@@ -181,11 +644,97 @@ def _HandleTime(time_str, debug=0):
                                                     # Second)
     #r'^'+my+mm+md+mH+mM+mS+r'$'                    # time stamp
   )
+  return tuple([re.compile(v) for v in formats])
+
+
+def _TimeFormats(dd, td):
+  """Return the compiled _HandleTime formats for the given delimiters."""
+  try:
+    return _HANDLE_TIME_FORMATS[(dd, td)]
+  except KeyError:
+    formats = _HANDLE_TIME_FORMATS[(dd, td)] = _BuildTimeFormats(dd, td)
+    return formats
+
+
+def _ExpandYear(year):
+  """Return the four digit year of a year matched by _HandleTime.
+
+  Args:
+    year: the year, abbreviated such as 08 or four digits.
+
+  Returns:
+    The year from 1970 to 2038, None if the year is out of that range.
+  """
+  if 0 <= year <= 38:
+    return year + 2000
+  elif 70 <= year < 100:
+    return year + 1900
+  elif 1970 <= year <= 2038:
+    return year
+  return
+
+
+def _HandleDate(time_str, debug=0):
+  """Extract date elements from a numeric date-only string.
+
+  Only the date-only layouts of _HandleTime are tried: (m,d), (y,m,d),
+  (m,d,y), (d,m,y) and (d,m), and only on strings with a date delimiter and
+  a supported year, such as '2008-03-30', '30/03/2008' or '3/30'. Such
+  strings are rendered from _DATE_TABLE without the help of dateutil.
+
+  Args:
+    time_str: a string will be checked on.
+    debug: debug level.
+
+  Returns:
+    a dictionary containing date elements like _HandleTime does.
+    None if the string is not in one of these layouts.
+  """
+  dd, td = _GetDelimiter(time_str, r'[-\\\\/]?', r':?')
+  if dd.endswith('?') or not td.endswith('?'):
+    return
+
+  formats = _TimeFormats(dd, td)
+  for i in _DATE_ONLY_FORMATS:
+    if debug: print 'using u"%s" to match %s' % (formats[i].pattern, time_str)
+    m = formats[i].match(time_str)
+    if m:
+      groups = m.groupdict()
+      match = {'month': int(groups['m']), 'day': int(groups['d'])}
+      if 'y' in groups:
+        match['year'] = int(groups['y'])
+        if _ExpandYear(match['year']) is None:
+          return
+      return match
+  return
+
+
+def _HandleTime(time_str, debug=0):
+  """Function to extract out possible date/time elements from a datetime like
+  string.
 
-  for v in formats:
-    if debug: print 'using u"%s" to match %s' % (v, time_str)
-    re.purge()
-    m = re.search(v, time_str)
+  Args:
+    time_str: a string will be checked on.
+    debug: debug level.
+
+  Returns:
+    a dictionary containing date/time elements.
+
+  Raises:
+    ValueError, when the passed in string isn't a date/time like string.
+  """
+  match = _HandleNames(time_str, debug)
+  if match:
+    return match
+
+  match = {}
+  dd = r'[-\\\\/]?'                        # regex for date delimiter
+  td = r':?'                               # regex for time delimiter
+
+  dd, td = _GetDelimiter(time_str, dd, td)
+  for v in _TimeFormats(dd, td):
+    if debug: print 'using u"%s" to match %s' % (v.pattern, time_str)
+    m = v.search(time_str)
     if m:
       if m.groups():
         try: year = int(m.group('y'))
@@ -320,7 +869,7 @@ def _UpdateDateTime(time_tuple, update_info):
     second = datetime.now().second
   if 'delta' in mdata:
     if mdata['format'] == 'y':
-      delta_day = mdata['delta'] * _DAYS_OF_YEAR
+      delta_day = mdata['delta'] * _DAYS_IN_YEAR
       delta_year = timedelta(days=delta_day)
       target = datetime.now() + delta_year
       year = target.year
@@ -392,7 +941,158 @@ def _ContainTimeInfo(datetime_info):
     return False
 
 
-def _FormatTime(str_time, debug=0, format='utc'):
+def _FormatDate(year, month, day, format='utc', debug=0):
+  """Format the midnight of a local date to XML compatible time string.
+
+  Formatted strings are kept in _DATE_TABLE keyed by the date and the
+  local offset in seconds, so each date is only formatted once per offset.
+  The offset is read from the time module, no datetime object is created
+  unless the date is missing from the table. The table is filled on first
+  use and emptied once it holds _DATE_TABLE_SIZE entries.
+
+  Args:
+    year: the year, four digits.
+    month: the month.
+    day: the day.
+    format: the output format. support 'local', 'utc' or 'epoch'.
+    debug: debug level.
+
+  Returns:
+    XML format compatible time string of the midnight of the date, or its
+    microseconds since the epoch for the 'epoch' format.
+
+  Raises:
+    ValueError: when the year, month and day is not a valid date.
+  """
+  offset = None
+  if format != 'local':
+    if time.localtime().tm_isdst > 0:
+      offset = -time.altzone
+    else:
+      offset = -time.timezone
+  key = (year, month, day, offset, format)
+  try:
+    return _DATE_TABLE[key]
+  except KeyError:
+    pass
+
+  t_obj = datetime(year, month, day)
+  if debug: print 'In date format, the local time is %s' % str(t_obj)
+  if offset is None:
+    formatted = t_obj.strftime('%Y-%m-%dT%H:%M:%S.000')
+  else:
+    t_obj -= timedelta(seconds=offset)
+    if debug: print 'In date format, the utctime is %s' % str(t_obj)
+    if format == 'epoch':
+      formatted = _Epoch(t_obj)
+    else:
+      formatted = t_obj.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+  if len(_DATE_TABLE) >= _DATE_TABLE_SIZE:
+    _DATE_TABLE.clear()
+  _DATE_TABLE[key] = formatted
+  return formatted
+
+
+class FormatTimeError(ValueError):
+  """Raised by the strict conversions.
+
+  Attributes:
+    code: one of the ERROR_* error codes.
+  """
+
+  def __init__(self, code, message):
+    ValueError.__init__(self, message)
+    self.code = code
+
+
+def _Classify(time_str):
+  """Cheaply reject strings that can not be a date/time string.
+
+  Only the length, the character classes and the words of the string are
+  checked. Every word has to be a single letter (such as the 'T' separator,
+  a '+3d' unit or the 'Z' zone), a month/weekday name, an AM/PM marker, a
+  keyword such as 'today' or a zone such as 'GMT' or 'UTC'. Numeric offsets
+  such as '+0200' only use accepted characters.
+
+  Args:
+    time_str: a string will be checked on.
+
+  Returns:
+    ERROR_NONE if the string may be a date/time string, otherwise one of
+    ERROR_EMPTY, ERROR_TOO_LONG, ERROR_BAD_CHARACTER and ERROR_UNKNOWN_WORD.
+  """
+  if not time_str or time_str.isspace():
+    return ERROR_EMPTY
+  if len(time_str) > _STRICT_MAX_LENGTH:
+    return ERROR_TOO_LONG
+  time_str = _AsUnicode(time_str)
+  if time_str is None or _STRICT_BAD_CHARACTER_RE.search(time_str):
+    return ERROR_BAD_CHARACTER
+  for word in _STRICT_WORD_RE.findall(time_str):
+    if len(word) == 1 or word.lower() in _STRICT_WORDS:
+      continue
+    if _LookupName(_MONTHS, word) is None and \
+       _LookupName(_WEEKDAYS, word) is None and \
+       _LookupName(_AM_PM, word) is None:
+      return ERROR_UNKNOWN_WORD
+  return ERROR_NONE
+
+
+def _CheckYear(year):
+  """Raise FormatTimeError if year is out of _STRICT_YEARS."""
+  if not _STRICT_YEARS[0] <= year <= _STRICT_YEARS[1]:
+    raise FormatTimeError(ERROR_YEAR_RANGE, 'Invalid year value')
+
+
+def _FormatDateTime(dt, format='utc', precise=0):
+  """Format an aware datetime object to XML compatible time string.
+
+  Args:
+    dt: an aware datetime object.
+    format: the output format. support 'local', 'utc' or 'epoch'.
+    precise: keep the fraction of seconds instead of writing '.000'.
+
+  Returns:
+    XML format compatible time string, or the microseconds since the epoch
+    in UTC for the 'epoch' format.
+  """
+  fraction = '.000'
+  if precise:
+    fraction = _FormatFraction(dt.microsecond)
+  if format == 'utc':
+    utc = pytz.utc
+    dt = dt.astimezone(utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S') + fraction + 'Z'
+  elif format == 'epoch':
+    return _Epoch(dt.astimezone(pytz.utc).replace(tzinfo=None))
+  elif format == 'local':
+    if 'TZ' in os.environ and os.environ['TZ']:
+      local = pytz.timezone(os.environ['TZ'])
+      dt = dt.astimezone(local)
+    else:
+      dt = dt.astimezone(tz.tzlocal())
+    return dt.strftime('%Y-%m-%dT%H:%M:%S') + fraction
+
+
+def _FormatTime(str_time, debug=0, format='utc', strict=0, precise=0):
+  """Run _ConvertTime, recording it if slow input capture is enabled.
+
+  Takes the same arguments and returns the same as _ConvertTime.
+  """
+  if _slow_threshold is None:
+    return _ConvertTime(str_time, debug, format, strict, precise)
+  start = time.time()
+  try:
+    return _ConvertTime(str_time, debug, format, strict, precise)
+  finally:
+    elapsed = time.time() - start
+    if elapsed >= _slow_threshold:
+      _RecordSlowInput(_AsString(str_time), format, elapsed,
+                       getattr(_state, 'path', None))
+
+
+def _ConvertTime(str_time, debug=0, format='utc', strict=0, precise=0):
   """Convert pass-in date/time string literals to XML compatible
   date/time string.
 
@@ -402,37 +1102,96 @@ def _FormatTime(str_time, debug=0, format='utc'):
   Args:
     str_time: A string literal look like a date/time format.
     debug: whether to output debug info.
-    format: the output format. support either 'local' or 'utc'.
+    format: the output format. support 'local', 'utc' or 'epoch'.
+    strict: reject strings failing _Classify up front, reject years out of
+      _STRICT_YEARS and raise FormatTimeError instead of printing errors.
+    precise: keep the fraction of seconds instead of writing '.000'.
 
   Returns:
-    XML format compatible time string with timezone considered.
+    XML format compatible time string with timezone considered, or the
+    microseconds since the epoch in UTC for the 'epoch' format.
     If failed, return None.
 
   Raises:
     ValueError: when giving up to try to parse the string.
+    FormatTimeError: when failed in strict mode.
   """
   # TODO(jimxu): adding support for detecting time/datetime objects.
+  str_time = _AsString(str_time)
   if debug: print 'passed in time is %s' % str_time
 
-  dt = _MatchFullTime(str_time)
+  if strict:
+    _state.path = 'classify'
+    code = _Classify(str_time)
+    if code:
+      raise FormatTimeError(code, 'Not a date/time string')
+
+  _state.path = 'fast'
+  if format == 'utc':
+    utc_time = _FastUTC(str_time, precise=precise)
+    if utc_time:
+      # both fast path layouts start with the four digit year.
+      if strict: _CheckYear(int(str_time[:4]))
+      if debug: print 'fast path formatted %s' % utc_time
+      return utc_time
+  elif format == 'epoch':
+    t_obj = _FastParse(str_time)
+    if t_obj is not None:
+      if strict: _CheckYear(int(str_time[:4]))
+      if debug: print 'fast path parsed %s' % t_obj
+      return _Epoch(t_obj)
+
+  _state.path = 'iso8601'
+  if strict:
+    try: dt = _MatchFullTime(str_time)
+    except (ValueError, iso8601.ParseError), e:
+      raise FormatTimeError(ERROR_INVALID_DATE, str(e))
+  else:
+    dt = _MatchFullTime(str_time)
+
+  if not dt:
+    _state.path = 'names'
+    mdata = _HandleNames(str_time, debug)
+    if mdata:
+      # the names were recognized, an invalid date such as 'Jun 31, 2008'
+      # is not going to parse in the slow paths either.
+      now = datetime.now()
+      if strict:
+        _CheckYear(mdata.get('year', now.year))
+        try:
+          datetime_tuple = _UpdateDateTime(
+              (now.year, now.month, now.day, 0, 0, 0), mdata)
+          dt = datetime(*datetime_tuple).replace(tzinfo=tz.tzlocal())
+        except (ValueError, OverflowError), e:
+          raise FormatTimeError(ERROR_INVALID_DATE, str(e))
+      else:
+        datetime_tuple = _UpdateDateTime(
+            (now.year, now.month, now.day, 0, 0, 0), mdata)
+        dt = datetime(*datetime_tuple).replace(tzinfo=tz.tzlocal())
 
+  mdata = None
   if not dt:
+    # numeric date-only strings go straight to _FormatDate, dateutil would
+    # only build the same midnight the slow way.
+    _state.path = 'date'
+    mdata = _HandleDate(str_time, debug)
+
+  if not dt and not mdata:
+    _state.path = 'dateutil'
     try: dt = parser.parse(str_time)
-    except ValueError: pass
-    else: dt = dt.replace(tzinfo=parser.tz.tzlocal())
+    except (ValueError, OverflowError): pass
+    else:
+      # keep the offset dateutil parsed, the string is local time otherwise.
+      if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz.tzlocal())
 
   if dt:
-    if format == 'utc':
-      utc = pytz.utc
-      dt = dt.astimezone(utc)
-      return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-    elif format == 'local':
-      if 'TZ' in os.environ and os.environ['TZ']:
-        local = pytz.timezone(os.environ['TZ'])
-        dt = dt.astimezone(local)
-      else:
-        dt = dt.astimezone(parser.tz.tzlocal())
-      return dt.strftime('%Y-%m-%dT%H:%M:%S.000')
+    if strict:
+      _CheckYear(dt.year)
+      try: return _FormatDateTime(dt, format, precise)
+      except (ValueError, OverflowError), e:
+        raise FormatTimeError(ERROR_INVALID_DATE, str(e))
+    return _FormatDateTime(dt, format, precise)
 
   # preset the time to the localtime of today 0:0:0
   datetime_tuple = (
@@ -440,18 +1199,29 @@ def _FormatTime(str_time, debug=0, format='utc'):
           datetime.now().year, datetime.now().month, \
               datetime.now().day, 0, 0, 0
 
-  mdata = _HandleTime(str_time)
+  if not mdata:
+    _state.path = 'handle'
+    if strict:
+      try: mdata = _HandleTime(str_time)
+      except ValueError, e:
+        raise FormatTimeError(ERROR_NO_MATCH, str(e))
+    else:
+      mdata = _HandleTime(str_time)
   if debug: print mdata
   if not mdata: return
 
-  datetime_tuple = _UpdateDateTime(datetime_tuple, mdata)
+  if strict:
+    try: datetime_tuple = _UpdateDateTime(datetime_tuple, mdata)
+    except (ValueError, OverflowError), e:
+      raise FormatTimeError(ERROR_INVALID_DATE, str(e))
+  else:
+    datetime_tuple = _UpdateDateTime(datetime_tuple, mdata)
   year, month, day, hour, minute, second = datetime_tuple
 
-  if 0 <= year <= 38:
-    year += 2000
-  elif 70 <= year < 100:
-    year += 1900
-  elif 39 <= year <= 69 or 100 <= year <= 1969 or year >= 2039:
+  year = _ExpandYear(year)
+  if year is None:
+    if strict:
+      raise FormatTimeError(ERROR_YEAR_RANGE, 'Invalid year value')
     raise ValueError('Invalid year value. Supported year is'
                        ' from 1970 to 2038 or abbreviated notation.'
                        ' Y2k can be represented as'
@@ -459,55 +1229,558 @@ def _FormatTime(str_time, debug=0, format='utc'):
 
   if not _ContainTimeInfo(mdata):
     try:
-      t_obj = datetime(year, month, day)
+      return _FormatDate(year, month, day, format, debug=debug)
     except ValueError, e:
+      if strict:
+        raise FormatTimeError(ERROR_INVALID_DATE, str(e))
       print 'Error converting time: %s' % e
       return
-    else:
-      if debug: print 'In date format, the local time is %s' % str(t_obj)
-      if format == 'utc':
-        t_obj -= _HandleTimeZone(debug=debug)[0]
-        if debug: print 'In date format, the utctime is %s' % str(t_obj)
-        return t_obj.strftime('%Y-%m-%dT%H:%M:%S.000Z')
-      return t_obj.strftime('%Y-%m-%dT%H:%M:%S.000')
   else:
     try:
       t_obj = datetime(year, month, day, hour, minute, second)
     except ValueError, e:
+      if strict:
+        raise FormatTimeError(ERROR_INVALID_DATE, str(e))
       print 'Error converting time: %s' % e
       return
     else:
       if debug: print 'In full time format, the local time is %s' % str(t_obj)
-      if format == 'utc':
+      if format != 'local':
         t_obj -= _HandleTimeZone(debug=debug)[0]
         if debug: print 'In full time format, the utctime is %s' % str(t_obj)
+        if format == 'epoch':
+          return _Epoch(t_obj)
         return t_obj.strftime('%Y-%m-%dT%H:%M:%S.000Z')
       return t_obj.strftime('%Y-%m-%dT%H:%M:%S.000')
 
-def ToLocal(time_string, debug=0):
+def ToLocal(time_string, debug=0, precise=0):
   """Convert the pass-in time string to local time string format.
 
   Args:
     time_string: an arbitrary date/time like string
     debug: debug level.
+    precise: keep the fraction of seconds (as '.mmm' or '.uuuuuu') instead
+      of writing '.000'.
 
   Returns:
     A well formatted time string using local datetime.
   """
-  return _FormatTime(time_string, debug, 'local')
+  return _FormatTime(time_string, debug, 'local', precise=precise)
 
 
-def ToUTC(time_string, debug=0):
+def ToUTC(time_string, debug=0, precise=0):
   """Convert the pass-in time string to UTC time string format.
 
   Args:
     time_string: an arbitrary date/time like string
     debug: debug level.
+    precise: keep the fraction of seconds (as '.mmm' or '.uuuuuu') instead
+      of writing '.000'.
 
   Returns:
     A well formatted time string using UTC datetime.
   """
-  return _FormatTime(time_string, debug, 'utc')
+  return _FormatTime(time_string, debug, 'utc', precise=precise)
+
+
+def ToRFC3339(time_string, debug=0):
+  """Normalize the pass-in time string keeping its fraction and offset.
+
+  A well formatted time string (see _MatchFullTime) is rewritten as
+  yyyy-mm-ddTHH:MM:SS.mmm[uuu](Z|+-HH:MM) straight from its characters:
+  the fraction of seconds is padded to milliseconds, or to microseconds if
+  it needs them, a missing offset becomes 'Z' and any other offset is kept
+  as is. No datetime conversion is done and the result is normalized
+  already, so normalizing well formatted data costs almost nothing.
+
+  Other strings are converted like ToUTC(time_string, precise=1).
+
+  Args:
+    time_string: an arbitrary date/time like string
+    debug: debug level.
+
+  Returns:
+    A well formatted time string.
+  """
+  time_string = _AsString(time_string)
+  fields = _SplitFullTime(time_string)
+  if fields and _ValidDate(*fields[:3]):
+    if debug: print 'normalizing %s in place' % time_string
+    offset = time_string[_DATE_WIDTH + _CLOCK_WIDTH:].lstrip('.0123456789')
+    return time_string[:_DATE_WIDTH + _CLOCK_WIDTH] + \
+        _FormatFraction(fields[6]) + (offset or 'Z')
+  return ToUTC(time_string, debug, precise=1)
+
+
+def _RecordSlowInput(str_time, format, elapsed, path):
+  """Store a slow conversion in the slow input ring buffer."""
+  global _slow_next
+  record = (str_time, format, elapsed, path)
+  _slow_lock.acquire()
+  try:
+    if len(_slow_inputs) < _slow_size:
+      _slow_inputs.append(record)
+    else:
+      _slow_inputs[_slow_next] = record
+    _slow_next = (_slow_next + 1) % _slow_size
+  finally:
+    _slow_lock.release()
+
+
+def EnableSlowInputCapture(threshold, size=100):
+  """Record every conversion taking longer than threshold.
+
+  The latest size slow conversions are kept in a ring buffer, see
+  GetSlowInputs. Enabling again clears the buffer. While disabled the
+  conversions are not timed at all.
+
+  Args:
+    threshold: the latency threshold in seconds.
+    size: the number of slow conversions kept.
+  """
+  global _slow_threshold, _slow_inputs, _slow_size, _slow_next
+  if size < 1:
+    raise ValueError('size must be positive')
+  _slow_lock.acquire()
+  try:
+    _slow_inputs = []
+    _slow_size = size
+    _slow_next = 0
+    _slow_threshold = threshold
+  finally:
+    _slow_lock.release()
+
+
+def DisableSlowInputCapture():
+  """Stop recording slow conversions, the recorded ones are kept."""
+  global _slow_threshold
+  _slow_threshold = None
+
+
+def GetSlowInputs():
+  """Return the recorded slow conversions, oldest first.
+
+  Returns:
+    A list of (time_string, format, seconds, path) tuples. time_string is
+    a str copy of buffer-like input, so it can be replayed later. path is
+    the last resolution step the conversion reached: 'classify', 'fast',
+    'iso8601', 'names', 'date', 'dateutil' or 'handle'. A conversion
+    failing in a step is recorded with that step.
+  """
+  _slow_lock.acquire()
+  try:
+    return _slow_inputs[_slow_next:] + _slow_inputs[:_slow_next]
+  finally:
+    _slow_lock.release()
+
+
+def _FormatTimeStrict(time_string, format):
+  """Run _FormatTime in strict mode and turn failures into error codes.
+
+  Args:
+    time_string: an arbitrary date/time like string
+    format: the output format. support either 'local' or 'utc'.
+
+  Returns:
+    A tuple of the well formatted time string and ERROR_NONE, or None and
+    one of the ERROR_* error codes if failed.
+  """
+  try:
+    return _FormatTime(time_string, 0, format, strict=1), ERROR_NONE
+  except FormatTimeError, e:
+    return None, e.code
+
+
+def ToLocalStrict(time_string):
+  """Convert the pass-in time string to local time string format strictly.
+
+  Unlike ToLocal, strings that can not be a date/time string are rejected
+  up front by their length, characters and words, before any parsing, and
+  nothing is printed, so invalid input is the cheapest to handle rather
+  than the most expensive. Strings passing these checks are parsed like
+  ToLocal does, dateutil included. Years out of 1970-2038 are rejected
+  with ERROR_YEAR_RANGE whatever the layout.
+
+  Args:
+    time_string: an arbitrary date/time like string
+
+  Returns:
+    A tuple of the well formatted time string using local datetime and
+    ERROR_NONE, or None and one of the ERROR_* error codes if failed.
+  """
+  return _FormatTimeStrict(time_string, 'local')
+
+
+def ToUTCStrict(time_string):
+  """Convert the pass-in time string to UTC time string format strictly.
+
+  See ToLocalStrict.
+
+  Args:
+    time_string: an arbitrary date/time like string
+
+  Returns:
+    A tuple of the well formatted time string using UTC datetime and
+    ERROR_NONE, or None and one of the ERROR_* error codes if failed.
+  """
+  return _FormatTimeStrict(time_string, 'utc')
+
+
+def _Factorize(time_strings):
+  """Split time strings into the distinct ones and an index of each string.
+
+  numpy.unique is used for numpy arrays, a dictionary otherwise.
+
+  Args:
+    time_strings: an iterable of date/time like strings or buffer-like
+      objects (buffer, bytearray, memoryview).
+
+  Returns:
+    A tuple of the list of distinct strings and a sequence holding, for
+    each of time_strings, the index of its value in that list.
+  """
+  if numpy is not None and isinstance(time_strings, numpy.ndarray):
+    uniques, inverse = numpy.unique(time_strings, return_inverse=True)
+    return list(uniques), inverse
+  index = {}
+  uniques = []
+  inverse = []
+  for time_string in time_strings:
+    time_string = _AsString(time_string)
+    i = index.get(time_string)
+    if i is None:
+      i = index[time_string] = len(uniques)
+      uniques.append(time_string)
+    inverse.append(i)
+  return uniques, inverse
+
+
+def _ConvertAll(time_strings, debug=0, format='utc', unique=0):
+  """Run _FormatTime over time strings, None for the ones failed.
+
+  Args:
+    time_strings: an iterable of date/time like strings or buffer-like
+      objects (buffer, bytearray, memoryview).
+    debug: debug level.
+    format: the output format. support 'local', 'utc' or 'epoch'.
+    unique: convert each distinct string once and scatter the results back,
+      see _Factorize.
+
+  Returns:
+    A list of the results of _FormatTime.
+  """
+  if unique:
+    uniques, inverse = _Factorize(time_strings)
+    converted = _ConvertAll(uniques, debug, format)
+    return [converted[i] for i in inverse]
+  results = []
+  for time_string in time_strings:
+    try:
+      results.append(_FormatTime(time_string, debug, format))
+    except (ValueError, OverflowError):
+      results.append(None)
+  return results
+
+
+def ToUTCBatch(time_strings, debug=0, unique=0):
+  """Convert a sequence of time strings to UTC time string format.
+
+  Args:
+    time_strings: an iterable of date/time like strings or buffer-like
+      objects (buffer, bytearray, memoryview), or a numpy array of strings.
+    debug: debug level.
+    unique: convert each distinct string only once, which makes the time
+      proportional to the number of distinct strings for low cardinality
+      data such as daily partitions.
+
+  Returns:
+    A list of well formatted time strings using UTC datetime, None for the
+    strings can not be converted.
+  """
+  return _ConvertAll(time_strings, debug, 'utc', unique)
+
+
+def ToUTCBuffer(data, offsets, out=None, debug=0):
+  """Convert time strings stored in one byte buffer to UTC time strings.
+
+  The well formatted and compact numeric time strings are parsed in place,
+  the rest are sliced out and go through ToUTC.
+
+  Args:
+    data: a str or buffer-like object (buffer, bytearray, memoryview).
+    offsets: a sequence of (start, end) offsets into data, one per string.
+    out: (optional) a writable buffer such as a bytearray of at least
+      len(offsets) * 24 bytes. The result of string i is written to
+      out[i * 24:(i + 1) * 24].
+    debug: debug level.
+
+  Returns:
+    If out is given, a list of the indexes of the strings can not be
+    converted, their slots in out are left untouched. Otherwise a list of
+    well formatted time strings using UTC datetime, None for the strings
+    can not be converted.
+  """
+  data = _AsBuffer(data)
+  results = []
+  for i, (start, end) in enumerate(offsets):
+    utc_time = _FastUTC(data, start, end)
+    if utc_time is None:
+      try:
+        utc_time = _FormatTime(data[start:end], debug, 'utc')
+      except (ValueError, OverflowError):
+        utc_time = None
+    if out is None:
+      results.append(utc_time)
+    elif utc_time is None:
+      results.append(i)
+    else:
+      out[i * _UTC_WIDTH:(i + 1) * _UTC_WIDTH] = utc_time
+  return results
+
+
+def ToEpochBatch(time_strings, out=None, valid=None, debug=0, unique=0):
+  """Convert time strings to UTC microseconds since the epoch.
+
+  The strings go through the same parsing as ToUTC but no time string is
+  formatted, the results are written into out and valid directly.
+
+  Args:
+    time_strings: a sequence of date/time like strings or buffer-like
+      objects (buffer, bytearray, memoryview).
+    out: (optional) a preallocated mutable sequence of at least
+      len(time_strings) integers, such as a list or an int64 numpy array.
+      Rows can not be converted are set to 0.
+    valid: (optional) a writable byte buffer of at least
+      (len(time_strings) + 7) // 8 bytes, such as an array('B') or a
+      bytearray. Bit i % 8 of byte i // 8 is set if row i is converted and
+      cleared otherwise, which is the Arrow validity bitmap layout.
+    debug: debug level.
+    unique: convert each distinct string only once, see ToUTCBatch.
+
+  Returns:
+    A tuple of out and valid, a list and an array('B') are created for the
+    ones not given.
+  """
+  if out is None or valid is None:
+    time_strings = list(time_strings)
+    if out is None:
+      out = [0] * len(time_strings)
+    if valid is None:
+      valid = array.array('B', [0]) * ((len(time_strings) + 7) // 8)
+
+  epochs = _ConvertAll(time_strings, debug, 'epoch', unique)
+  for i, epoch in enumerate(epochs):
+    if epoch is None:
+      out[i] = 0
+      valid[i >> 3] &= ~(1 << (i & 7)) & 0xff
+    else:
+      out[i] = epoch
+      valid[i >> 3] |= 1 << (i & 7)
+  return out, valid
+
+
+def _Int64Array(size):
+  """Return a zeroed native int64 buffer of size items.
+
+  A numpy array if numpy is installed, otherwise an array.array of the
+  first 8 byte integer typecode.
+
+  Raises:
+    ImportError: when neither is available.
+  """
+  if numpy is not None:
+    return numpy.zeros(size, dtype=numpy.int64)
+  for typecode in ('q', 'l'):
+    try:
+      values = array.array(typecode, [0])
+    except ValueError:
+      continue
+    if values.itemsize == 8:
+      return values * size
+  raise ImportError('an int64 buffer requires numpy on this platform')
+
+
+def ToArrow(time_strings, debug=0, unique=0):
+  """Convert time strings to a pyarrow timestamp[us, tz=UTC] array.
+
+  Rows can not be converted are null. Requires pyarrow.
+
+  Args:
+    time_strings: a sequence of date/time like strings or buffer-like
+      objects (buffer, bytearray, memoryview).
+    debug: debug level.
+    unique: convert each distinct string only once, see ToUTCBatch.
+
+  Returns:
+    A pyarrow.TimestampArray.
+
+  Raises:
+    ImportError: when pyarrow is not installed.
+  """
+  if pyarrow is None:
+    raise ImportError('ToArrow requires pyarrow')
+  time_strings = list(time_strings)
+  values, valid = ToEpochBatch(time_strings, _Int64Array(len(time_strings)),
+                               debug=debug, unique=unique)
+  data = values
+  if isinstance(values, array.array):
+    # array.array only has the old buffer interface in python 2.
+    data = values.tostring()
+  return pyarrow.Array.from_buffers(
+      pyarrow.timestamp('us', tz='UTC'), len(values),
+      [pyarrow.py_buffer(valid.tostring()), pyarrow.py_buffer(data)])
+
+
+class StreamConverter(object):
+  """Convert a stream of time strings to UTC reusing the previous parse.
+
+  Consecutive time strings of a log usually share the date and the offset
+  and only differ in the clock. When a well formatted time string has the
+  same date and the same offset as the previous one, only its clock is
+  parsed, and the formatted UTC date is reused unless the clock moves it
+  to another day. The fraction of seconds may differ, it is checked but
+  not used since the output always writes '.000'. Every other string is parsed in full or
+  goes through ToUTC, so the results are always the same as ToUTC.
+
+  Usage:
+    converter = StreamConverter()
+    for line in log:
+      utc_time = converter.ToUTC(line[:29])
+  """
+
+  def __init__(self, debug=0):
+    self.debug = debug
+    self._date = None       # date of the previous well formatted string
+    self._zone = None       # offset of the previous string as written
+    self._local_day = None  # date of the previous string as datetime
+    self._offset = 0        # offset of the previous string in seconds
+    self._prefixes = {}     # day shift from _local_day to formatted date
+
+  def ToUTC(self, time_string):
+    """Convert the pass-in time string to UTC time string format.
+
+    Args:
+      time_string: an arbitrary date/time like string
+
+    Returns:
+      A well formatted time string using UTC datetime.
+    """
+    time_string = _AsString(time_string)
+    if self._date is not None and time_string[:_DATE_WIDTH] == self._date:
+      m = _CLOCK_RE.match(time_string, _DATE_WIDTH)
+      if m and time_string[m.end():] == self._zone:
+        if self.debug: print 'reusing the date of %s' % self._date
+        return self._Format(time_string, m.groups())
+
+    self._date = None
+    m = _FULLTIME_RE.match(time_string)
+    if not m:
+      return ToUTC(time_string, self.debug)
+    year, month, day = [int(g) for g in m.groups()[:3]]
+    try:
+      self._local_day = datetime(year, month, day)
+    except ValueError:
+      return ToUTC(time_string, self.debug)
+    self._offset = 0
+    if m.group(9):
+      self._offset = (int(m.group(10)) * 60 + int(m.group(11))) * 60
+      if m.group(9) == '-':
+        self._offset = -self._offset
+    self._prefixes = {}
+    self._date = time_string[:_DATE_WIDTH]
+    self._zone = m.group(8) or ''
+    return self._Format(time_string, m.groups()[3:6])
+
+  def _Format(self, time_string, clock):
+    """Format the clock of a string sharing the date of the previous one.
+
+    Args:
+      time_string: the well formatted time string.
+      clock: the hour, minute and second strings of time_string.
+
+    Returns:
+      A well formatted time string using UTC datetime.
+    """
+    hour, minute, second = [int(g) for g in clock]
+    shift, secs = divmod(hour * 3600 + minute * 60 + second - self._offset,
+                         86400)
+    prefix = self._prefixes.get(shift)
+    if prefix is None:
+      try:
+        utc_day = self._local_day + timedelta(days=shift)
+      except OverflowError:
+        return ToUTC(time_string, self.debug)
+      prefix = '%04d-%02d-%02dT' % (utc_day.year, utc_day.month, utc_day.day)
+      self._prefixes[shift] = prefix
+    return '%s%02d:%02d:%02d.000Z' % (prefix, secs // 3600, secs // 60 % 60,
+                                      secs % 60)
+
+
+class Profile(object):
+  """Profile conversions with cProfile and, if available, tracemalloc.
+
+  Usage:
+    profile = Profile()
+    profile.Start()
+    ToUTCBatch(rows)
+    profile.Stop()
+    profile.Report()
+    profile.Dump('formattime.prof')
+
+  It is also a context manager for the with statement. Together with
+  GetSlowInputs the dumped statistics let slow inputs be reproduced and
+  studied offline.
+  """
+
+  def __init__(self, memory=True):
+    if cProfile is None:
+      raise ImportError('Profile requires cProfile')
+    self.profiler = cProfile.Profile()
+    self.memory = memory and tracemalloc is not None
+    self.snapshot = None
+    self._tracing = False
+
+  def Start(self):
+    """Start profiling."""
+    if self.memory and not tracemalloc.is_tracing():
+      tracemalloc.start()
+      self._tracing = True
+    self.profiler.enable()
+
+  def Stop(self):
+    """Stop profiling and take the memory snapshot."""
+    self.profiler.disable()
+    if self.memory:
+      self.snapshot = tracemalloc.take_snapshot()
+      if self._tracing:
+        tracemalloc.stop()
+        self._tracing = False
+
+  def Report(self, stream=None, limit=20):
+    """Print the slowest functions and the largest allocations.
+
+    Args:
+      stream: (optional) the file to print to, default to stdout.
+      limit: the number of functions and allocation sites printed.
+    """
+    stats = pstats.Stats(self.profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    if self.snapshot is not None:
+      stream = stream or sys.stdout
+      for stat in self.snapshot.statistics('lineno')[:limit]:
+        stream.write('%s\n' % stat)
+
+  def Dump(self, path):
+    """Write the profile statistics to path for pstats."""
+    self.profiler.dump_stats(path)
+
+  def __enter__(self):
+    self.Start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Stop()
+    return False
 
 # Vim :set ts=2 sw=2 expandtab
 # The End
@@ -0,0 +1,180 @@
+#!/usr/bin/python2.4
+
+# Copyright 2008 Yongjian Xu
+
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA
+
+
+"""Throughput benchmark of formattime.
+
+Runs the converters over generated corpora and prints the number of
+strings converted per second for each of them, then compares the plain and
+unique ToUTCBatch strategies on a low cardinality corpus by speed and by
+the bytes held by their results and factorization:
+
+  python formattime_bench.py [rows]
+"""
+
+
+__author__ = 'Yongjian (Jim) Xu <i3dmaster@gmail.com>'
+
+
+import os
+import random
+import sys
+import time
+import formattime
+
+_SEED = 2008
+_ROWS = 2000
+
+
+def _Canonical(rand, rows):
+  """Well formatted time strings."""
+  return ['%04d-%02d-%02dT%02d:%02d:%02d.000Z' % (
+              rand.randint(1970, 2037), rand.randint(1, 12),
+              rand.randint(1, 28), rand.randint(0, 23),
+              rand.randint(0, 59), rand.randint(0, 59))
+          for i in range(rows)]
+
+
+def _Log(rand, rows):
+  """Sorted well formatted time strings a few seconds apart."""
+  secs = time.mktime((2008, 4, 1, 23, 0, 0, 0, 0, -1))
+  corpus = []
+  for i in range(rows):
+    secs += rand.randint(0, 5)
+    corpus.append(time.strftime('%Y-%m-%dT%H:%M:%S.000-07:00',
+                                time.gmtime(secs)))
+  return corpus
+
+
+def _LogMilliseconds(rand, rows):
+  """Sorted well formatted time strings with changing milliseconds."""
+  secs = time.mktime((2008, 4, 1, 23, 0, 0, 0, 0, -1))
+  corpus = []
+  for i in range(rows):
+    secs += rand.randint(0, 5)
+    corpus.append(time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(secs)) +
+                  '.%03d-07:00' % rand.randint(0, 999))
+  return corpus
+
+
+def _Partitions(rand, rows):
+  """Time strings of hourly partitions of one week."""
+  return ['2008-04-%02dT%02d:00:00Z' % (rand.randint(1, 7),
+                                        rand.randint(0, 23))
+          for i in range(rows)]
+
+
+def _Invalid(rand, rows):
+  """Random printable garbage which can not be a date/time string."""
+  letters = 'abcdefghijklmnopqrstuvwxyz!@#$%^&*()_=[]{};"<>?|~'
+  return [''.join([rand.choice(letters)
+                   for j in range(rand.randint(1, 40))])
+          for i in range(rows)]
+
+
+def _Adversarial(rand, rows):
+  """Strings looking like date/time strings which no format accepts."""
+  makers = (
+      lambda: '%d/%d/%d %d:%d' % tuple([rand.randint(32, 99)
+                                        for j in range(5)]),
+      lambda: '%04d-%02d-%02d' % (rand.randint(1970, 2037),
+                                  rand.randint(13, 99),
+                                  rand.randint(32, 99)),
+      lambda: '-'.join([str(rand.randint(0, 9))
+                        for j in range(rand.randint(4, 30))]),
+      lambda: '1' * rand.randint(1, 200),
+      lambda: 'Mar %d, %d' % (rand.randint(32, 99), rand.randint(0, 9999)),
+  )
+  return [rand.choice(makers)() for i in range(rows)]
+
+
+def _Run(convert, errors, corpus):
+  """Return strings handled per second by convert over corpus.
+
+  errors is the tuple of exceptions convert documents for rejected
+  strings, anything else escapes.
+  """
+  start = time.time()
+  for time_string in corpus:
+    try:
+      convert(time_string)
+    except errors:
+      pass
+  elapsed = time.time() - start
+  return len(corpus) / max(elapsed, 1e-9)
+
+
+def _Footprint(corpus, unique):
+  """Return the bytes held by the results of ToUTCBatch on corpus.
+
+  For the unique strategy the factorization of the corpus is added.
+  """
+  results = formattime.ToUTCBatch(corpus, unique=unique)
+  sizes = {}
+  for result in results:
+    sizes[id(result)] = sys.getsizeof(result)
+  footprint = sys.getsizeof(results) + sum(sizes.values())
+  if unique:
+    uniques, inverse = formattime._Factorize(corpus)
+    footprint += sys.getsizeof(uniques) + sys.getsizeof(inverse) + \
+        sys.getsizeof(dict.fromkeys(uniques))
+  return footprint
+
+
+def main(argv):
+  rows = _ROWS
+  if len(argv) > 1:
+    rows = int(argv[1])
+  rand = random.Random(_SEED)
+  corpora = (('canonical', _Canonical(rand, rows)),
+             ('log', _Log(rand, rows)),
+             ('log ms', _LogMilliseconds(rand, rows)),
+             ('invalid', _Invalid(rand, rows)),
+             ('adversarial', _Adversarial(rand, rows)))
+  converters = (('ToUTC', formattime.ToUTC, ValueError),
+                ('ToUTCStrict', formattime.ToUTCStrict, ()),
+                ('Stream', formattime.StreamConverter().ToUTC, ValueError))
+
+  # ToUTC prints the errors of some invalid strings, keep them out of the
+  # report.
+  stdout = sys.stdout
+  results = []
+  for corpus_name, corpus in corpora:
+    for converter_name, convert, errors in converters:
+      sys.stdout = open(os.devnull, 'w')
+      try:
+        results.append((corpus_name, converter_name,
+                        _Run(convert, errors, corpus)))
+      finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+  for corpus_name, converter_name, rate in results:
+    print '%-12s %-12s %10.0f strings/s' % (corpus_name, converter_name, rate)
+
+  corpus = _Partitions(rand, rows)
+  for name, unique in (('plain', 0), ('unique', 1)):
+    start = time.time()
+    formattime.ToUTCBatch(corpus, unique=unique)
+    rate = len(corpus) / max(time.time() - start, 1e-9)
+    print '%-12s %-12s %10.0f strings/s %10d bytes' % (
+        'partitions', 'Batch ' + name, rate, _Footprint(corpus, unique))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
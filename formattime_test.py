@@ -23,6 +23,8 @@ __author__ = 'Yongjian (Jim) Xu <i3dmaster@gmail.com>'
 
 from datetime import datetime
 import re
+import StringIO
+import threading
 import os
 import pytz
 import time
@@ -301,6 +303,525 @@ class FormatTimeTestCase(unittest.TestCase):
       os.environ['TZ'] = old_tz
     time.tzset()
 
+  def testToUTCFullTimeOffset(self):
+    time_str = '2007-11-09T07:00:00.000-08:00'
+    self.assertEqual('2007-11-09T15:00:00.000Z', formattime.ToUTC(time_str))
+
+  def testToUTCBytearray(self):
+    time_str = '2007-11-09T23:30:00+08:00'
+    self.assertEqual(formattime.ToUTC(time_str),
+                     formattime.ToUTC(bytearray(time_str)))
+
+  def testToUTCNumeric(self):
+    local_t = time.mktime((2007, 11, 30, 10, 0, 0, 0, 0, -1))
+    utc_t = datetime.utcfromtimestamp(local_t)
+    self.assertEqual(utc_t.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                     formattime.ToUTC('20071130T100000'))
+
+  def testToUTCBatch(self):
+    self.assertEqual(['2007-11-09T15:00:00.000Z', None],
+                     formattime.ToUTCBatch(['2007-11-09T07:00:00-08:00',
+                                            '2007-06-00']))
+
+  def testToUTCBufferOffsets(self):
+    data = bytearray('2007-11-09T07:00:00-08:00|2007-11-09T07:00:00Z')
+    self.assertEqual(['2007-11-09T15:00:00.000Z', '2007-11-09T07:00:00.000Z'],
+                     formattime.ToUTCBuffer(data, [(0, 25), (26, 46)]))
+
+  def testToUTCBufferInPlace(self):
+    data = buffer('2007-11-09T07:00:00-08:00|2007-11-09T07:00:00Z|20071130')
+    self.assertEqual('2007-11-09T07:00:00.000Z',
+                     formattime._FastUTC(data, 26, 46))
+    self.assertNotEqual(None, formattime._FastUTC(data, 47, 55))
+
+  def testToUTCNumericOldYear(self):
+    self.assertEqual(None, formattime._FastUTC('00010101'))
+    self.assertEqual(None, formattime._FastUTC('00690101'))
+
+  def testToUTCNumericDstGap(self):
+    old_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/Los_Angeles'
+    time.tzset()
+    try:
+      self.assertEqual(formattime.ToUTC('2008-03-09 02:30:00'),
+                       formattime.ToUTC('20080309T023000'))
+    finally:
+      if old_tz is None:
+        del os.environ['TZ']
+      else:
+        os.environ['TZ'] = old_tz
+      time.tzset()
+
+  def testToUTCBatchOverflow(self):
+    self.assertEqual([None, '2007-11-09T07:00:00.000Z'],
+                     formattime.ToUTCBatch(['1' * 40, '2007-11-09T07:00:00Z']))
+    self.assertEqual([None], formattime.ToUTCBuffer('1' * 40, [(0, 40)]))
+
+  def testToUTCBufferOut(self):
+    data = memoryview('2007-11-09T07:00:00Z|foo bar')
+    out = bytearray(48)
+    self.assertEqual([1], formattime.ToUTCBuffer(data, [(0, 20), (21, 28)],
+                                                 out))
+    self.assertEqual('2007-11-09T07:00:00.000Z', str(out[:24]))
+
+  def testFormatDateTable(self):
+    formattime._DATE_TABLE.clear()
+    first = formattime.ToUTC(r'2008\04\01')
+    self.assertEqual(1, len(formattime._DATE_TABLE))
+    self.assertEqual(first, formattime.ToUTC(r'2008\04\01'))
+    self.assertEqual(1, len(formattime._DATE_TABLE))
+    offset = formattime._DATE_TABLE.keys()[0][3]
+    self.assertTrue(offset in (-time.timezone, -time.altzone))
+
+  def testFormatDateSkipDateutil(self):
+    def Fail(time_str):
+      raise AssertionError('dateutil used for %s' % time_str)
+    year = datetime.now().year
+    parse = formattime.parser.parse
+    formattime.parser.parse = Fail
+    try:
+      for time_str in ('2008-03-30', '03/30/2008', '30/03/2008', '08-03-30'):
+        self.assertEqual('2008-03-30T00:00:00.000', formattime.ToLocal(time_str))
+      self.assertEqual('%d-03-30T00:00:00.000' % year,
+                       formattime.ToLocal('3/30'))
+      formattime._DATE_TABLE.clear()
+      formattime.ToUTC('2008-03-30')
+      self.assertEqual(1, len(formattime._DATE_TABLE))
+    finally:
+      formattime.parser.parse = parse
+
+  def testHandleDate(self):
+    self.assertEqual({'year': 2008, 'month': 3, 'day': 30},
+                     formattime._HandleDate('2008-03-30'))
+    self.assertEqual({'month': 3, 'day': 30}, formattime._HandleDate('30/3'))
+    self.assertEqual(None, formattime._HandleDate('1850-01-01'))
+    self.assertEqual(None, formattime._HandleDate('20080330'))
+    self.assertEqual(None, formattime._HandleDate('3/30 10:00'))
+
+  def testFormatDateTableBounded(self):
+    old_size = formattime._DATE_TABLE_SIZE
+    formattime._DATE_TABLE_SIZE = 2
+    formattime._DATE_TABLE.clear()
+    try:
+      for day in range(1, 6):
+        formattime.ToLocal(r'2008\04\%02d' % day)
+        self.assertTrue(len(formattime._DATE_TABLE) <= 2)
+    finally:
+      formattime._DATE_TABLE_SIZE = old_size
+
+  def testFormatDateTableInvalidDate(self):
+    self.assertEqual(None, formattime.ToUTC('2007-02-30'))
+
+  def testHandleNamesMonthDayYear(self):
+    mdata = formattime._HandleTime('Mar 30, 2008')
+    self.assertEqual({'year': 2008, 'month': 3, 'day': 30}, mdata)
+
+  def testHandleNamesWeekdayDayMonthTime(self):
+    mdata = formattime._HandleTime('Sunday, 30th march 2008 11:30 P.M.')
+    self.assertEqual((2008, 3, 30, 23, 30, 0),
+                     (mdata['year'], mdata['month'], mdata['day'],
+                      mdata['hour'], mdata['minute'], mdata['second']))
+
+  def testHandleNamesPrefix(self):
+    self.assertEqual(9, formattime._HandleTime('Sept 1')['month'])
+    self.assertEqual(None, formattime._HandleNames('Ju 1'))
+    self.assertEqual(None, formattime._HandleNames('Foo, Mar 30, 2008'))
+
+  def testHandleNamesAmPm(self):
+    self.assertEqual(0, formattime._HandleTime('12:15 am')['hour'])
+    self.assertEqual(12, formattime._HandleTime('12pm')['hour'])
+    self.assertEqual(None, formattime._HandleNames('13:15 pm'))
+
+  def testHandleNamesNextFormat(self):
+    self.assertEqual({'hour': 21, 'minute': 0, 'second': 0},
+                     formattime._HandleNames('9 pm'))
+    self.assertEqual(0, formattime._HandleNames('12 am')['hour'])
+    formattime.EnableSlowInputCapture(0)
+    try:
+      formattime.ToLocal('9 pm')
+    finally:
+      formattime.DisableSlowInputCapture()
+    self.assertEqual('names', formattime.GetSlowInputs()[0][3])
+
+  def testHandleNamesSkipDateutil(self):
+    def Fail(time_str):
+      raise AssertionError('dateutil used for %s' % time_str)
+    parse = formattime.parser.parse
+    formattime.parser.parse = Fail
+    try:
+      self.assertEqual(formattime.ToLocal('April 10, 2008 9:05 pm'),
+                       '2008-04-10T21:05:00.000')
+    finally:
+      formattime.parser.parse = parse
+
+  def testHandleNamesInvalidDate(self):
+    def Fail(time_str):
+      raise AssertionError('dateutil used for %s' % time_str)
+    parse = formattime.parser.parse
+    formattime.parser.parse = Fail
+    try:
+      self.assertRaises(ValueError, formattime.ToUTC, 'Jun 31, 2008')
+      self.assertRaises(ValueError, formattime.ToLocal, 'Feb 29, 2007')
+    finally:
+      formattime.parser.parse = parse
+
+  def testRegisterLocale(self):
+    formattime.RegisterLocale(
+        'fr', ('janvier', 'fevrier', 'mars', 'avril', 'mai', 'juin',
+               'juillet', 'aout', 'septembre', 'octobre', 'novembre',
+               'decembre'),
+        ('lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi',
+         'dimanche'))
+    try:
+      mdata = formattime._HandleTime('jeudi 10 avril 2008')
+      self.assertEqual((2008, 4, 10),
+                       (mdata['year'], mdata['month'], mdata['day']))
+    finally:
+      del formattime._LOCALES['fr']
+      formattime._LOCALE_ORDER.remove('fr')
+
+  def testRegisterLocaleNonAscii(self):
+    formattime.RegisterLocale(
+        'de', ('Januar', 'Februar', 'M\xc3\xa4rz', 'April', 'Mai', 'Juni',
+               'Juli', 'August', 'September', 'Oktober', 'November',
+               'Dezember'),
+        (u'Montag', u'Dienstag', u'Mittwoch', u'Donnerstag', u'Freitag',
+         u'Samstag', u'Sonntag'))
+    try:
+      for time_str in ('Sonntag 30 M\xc3\xa4rz 2008', '30 M\xc3\x84RZ 2008',
+                       u'Sonntag 30 m\xe4rz 2008'):
+        mdata = formattime._HandleTime(time_str)
+        self.assertEqual((2008, 3, 30),
+                         (mdata['year'], mdata['month'], mdata['day']))
+      self.assertEqual(formattime.ERROR_NONE,
+                       formattime._Classify('30 M\xc3\xa4rz 2008'))
+      self.assertEqual(formattime.ERROR_BAD_CHARACTER,
+                       formattime._Classify('30 M\xe4rz 2008'))
+    finally:
+      del formattime._LOCALES['de']
+      formattime._LOCALE_ORDER.remove('de')
+
+  def testClassify(self):
+    self.assertEqual(formattime.ERROR_NONE,
+                     formattime._Classify('Sun, Mar 30th 2008 11:30 am'))
+    self.assertEqual(formattime.ERROR_EMPTY, formattime._Classify('  '))
+    self.assertEqual(formattime.ERROR_TOO_LONG,
+                     formattime._Classify('1' * 100))
+    self.assertEqual(formattime.ERROR_BAD_CHARACTER,
+                     formattime._Classify('2008-04-01; DROP'))
+    self.assertEqual(formattime.ERROR_UNKNOWN_WORD,
+                     formattime._Classify('foo bar'))
+
+  def testToUTCStrict(self):
+    time_str = '2007-11-09T07:00:00.000-08:00'
+    self.assertEqual(('2007-11-09T15:00:00.000Z', formattime.ERROR_NONE),
+                     formattime.ToUTCStrict(time_str))
+    self.assertEqual((formattime.ToLocal(r'2008\04\01'), formattime.ERROR_NONE),
+                     formattime.ToLocalStrict(r'2008\04\01'))
+
+  def testToUTCStrictErrors(self):
+    self.assertEqual((None, formattime.ERROR_UNKNOWN_WORD),
+                     formattime.ToUTCStrict('foo bar'))
+    self.assertEqual((None, formattime.ERROR_NO_MATCH),
+                     formattime.ToUTCStrict('60/100'))
+    self.assertEqual((None, formattime.ERROR_INVALID_DATE),
+                     formattime.ToUTCStrict('2007-02-30'))
+    self.assertEqual((None, formattime.ERROR_INVALID_DATE),
+                     formattime.ToLocalStrict('2007-02-30T00:00:00Z'))
+    self.assertEqual((None, formattime.ERROR_YEAR_RANGE),
+                     formattime.ToUTCStrict('1950-01-01'))
+
+  def testToUTCStrictNeverRaises(self):
+    for time_str, code in (
+        ('+999999999d', formattime.ERROR_INVALID_DATE),
+        ('2008-12-31T23:59:59-23:59', formattime.ERROR_NONE),
+        ('Jun 31, 2008', formattime.ERROR_INVALID_DATE),
+        ('Mar 30, 1850', formattime.ERROR_YEAR_RANGE),
+        ('Mar 30 9999', formattime.ERROR_YEAR_RANGE),
+        ('9999-03-30', formattime.ERROR_YEAR_RANGE)):
+      self.assertEqual(code, formattime.ToUTCStrict(time_str)[1])
+
+  def testToUTCDateutilOverflow(self):
+    self.assertRaises(ValueError, formattime.ToUTC, '1' * 40)
+
+  def testToUTCDeltaYear(self):
+    self.assertEqual(formattime.ERROR_NONE, formattime.ToUTCStrict('+1y')[1])
+    self.assertTrue(formattime.ToLocal('+1y'))
+
+  def testToUTCStrictDateutil(self):
+    for time_str in ('Tue, 01 Apr 2008 10:00:00 GMT',
+                     'Tue, 01 Apr 2008 10:00:00 +0000',
+                     '2008-04-01T10:00:00+0200', '2008-04-01 10:00:00.123',
+                     '2008-04-01 10:00:00 UTC'):
+      self.assertEqual((formattime.ToUTC(time_str), formattime.ERROR_NONE),
+                       formattime.ToUTCStrict(time_str))
+    self.assertEqual((None, formattime.ERROR_NO_MATCH),
+                     formattime.ToUTCStrict('99/99/99 99:99'))
+
+  def testToUTCStrictRejectsBeforeDateutil(self):
+    def Fail(time_str):
+      raise AssertionError('dateutil used for %s' % time_str)
+    parse = formattime.parser.parse
+    formattime.parser.parse = Fail
+    try:
+      self.assertEqual((None, formattime.ERROR_UNKNOWN_WORD),
+                       formattime.ToUTCStrict('Tue, 01 Apr 2008 10:00 XYZ'))
+      self.assertEqual((None, formattime.ERROR_TOO_LONG),
+                       formattime.ToUTCStrict('1' * 100))
+    finally:
+      formattime.parser.parse = parse
+
+  def testToUTCStrictYearRange(self):
+    for time_str in ('1850-01-01', '1850-01-01T00:00:00Z',
+                     '9999-03-30T00:00:00Z', '99990330', '18500101T000000',
+                     '1850-01-01 10:00:00 GMT', 'Mar 30, 1850'):
+      self.assertEqual((None, formattime.ERROR_YEAR_RANGE),
+                       formattime.ToUTCStrict(time_str))
+      self.assertEqual((None, formattime.ERROR_YEAR_RANGE),
+                       formattime.ToLocalStrict(time_str))
+
+  def testStreamConverter(self):
+    converter = formattime.StreamConverter()
+    for time_str in ('2007-11-09T15:59:58.000-08:00',
+                     '2007-11-09T15:59:59.000-08:00',
+                     '2007-11-09T16:00:00.000-08:00',
+                     '2007-11-09T16:00:00.000+05:30',
+                     '2007-11-10T00:00:01Z',
+                     '2007-11-10T00:00:02Z',
+                     '2007-11-10T00:00:02',
+                     r'2008\04\01'):
+      self.assertEqual(formattime.ToUTC(time_str), converter.ToUTC(time_str))
+    self.assertRaises(ValueError, converter.ToUTC, '2007-11-10T24:00:02')
+
+  def testStreamConverterReuse(self):
+    converter = formattime.StreamConverter()
+    converter.ToUTC('2007-11-09T23:59:59.000-08:00')
+    self.assertEqual({1: '2007-11-10T'}, converter._prefixes)
+    self.assertEqual('2007-11-10T07:59:59.000Z',
+                     converter.ToUTC('2007-11-09T23:59:59.000-08:00'))
+    self.assertEqual('2007-11-09T23:00:00.000Z',
+                     converter.ToUTC('2007-11-09T15:00:00.000-08:00'))
+    self.assertEqual({0: '2007-11-09T', 1: '2007-11-10T'},
+                     converter._prefixes)
+
+  def testStreamConverterFraction(self):
+    converter = formattime.StreamConverter()
+    converter.ToUTC('2007-11-09T23:59:58.123-08:00')
+    for time_str in ('2007-11-09T23:59:59.456-08:00',
+                     '2007-11-09T15:00:00-08:00',
+                     '2007-11-09T15:00:00.999999-08:00'):
+      self.assertEqual(formattime.ToUTC(time_str), converter.ToUTC(time_str))
+    self.assertEqual('2007-11-09T', converter._date)
+    self.assertEqual({0: '2007-11-09T', 1: '2007-11-10T'},
+                     converter._prefixes)
+    for time_str in ('2007-11-09T15:00:00.1234567-08:00',
+                     '2007-11-09T15:00:00.-08:00'):
+      self.assertEqual(formattime.ToUTC(time_str), converter.ToUTC(time_str))
+      self.assertEqual(None, converter._date)
+
+  def testToEpochBatch(self):
+    values, valid = formattime.ToEpochBatch(
+        ['1970-01-01T00:00:01Z', 'foo bar', '2007-11-09T07:00:00-08:00',
+         r'2008\04\01'])
+    self.assertEqual([1000000, 0, 1194620400000000], values[:3])
+    self.assertEqual([0x0d], list(valid))
+
+  def testToEpochBatchOut(self):
+    out = [-1] * 3
+    valid = bytearray([0xff])
+    formattime.ToEpochBatch(['1970-01-02T00:00:00+01:00', '2007-02-30'],
+                            out, valid)
+    self.assertEqual([82800000000, 0, -1], out)
+    self.assertEqual(0xfd, valid[0])
+
+  def testToEpochBatchMatchesToUTC(self):
+    time_str = r'2008\04\01'
+    epoch = formattime.ToEpochBatch([time_str])[0][0]
+    utc_t = datetime.utcfromtimestamp(epoch // 1000000)
+    self.assertEqual(formattime.ToUTC(time_str),
+                     utc_t.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+
+  def testToArrow(self):
+    if formattime.pyarrow is None:
+      self.assertRaises(ImportError, formattime.ToArrow, ['now'])
+      return
+    arr = formattime.ToArrow(['1970-01-01T00:00:01Z', 'foo bar', '1' * 40,
+                              '2007-11-09T07:00:00.000001-08:00'])
+    self.assertEqual(formattime.pyarrow.timestamp('us', tz='UTC'), arr.type)
+    self.assertEqual(2, arr.null_count)
+    self.assertEqual([1000000, None, None, 1194620400000001],
+                     arr.cast(formattime.pyarrow.int64()).to_pylist())
+
+  def testInt64Array(self):
+    values = formattime._Int64Array(3)
+    values[1] = 2 ** 62
+    self.assertEqual([0, 2 ** 62, 0], list(values))
+
+  def testSplitFullTime(self):
+    self.assertEqual((1937, 1, 1, 12, 0, 27, 870000, 20),
+                     formattime._SplitFullTime('1937-01-01T12:00:27.87+00:20'))
+    self.assertEqual((1997, 7, 1, 23, 59, 59, 0, None),
+                     formattime._SplitFullTime('1997-07-01T23:59:59Z'))
+
+  def testToUTCPrecise(self):
+    time_str = '2007-11-09T07:00:00.123456-08:00'
+    self.assertEqual('2007-11-09T15:00:00.000Z', formattime.ToUTC(time_str))
+    self.assertEqual('2007-11-09T15:00:00.123456Z',
+                     formattime.ToUTC(time_str, precise=1))
+    self.assertEqual('2007-11-09T15:00:00.500Z',
+                     formattime.ToUTC('2007-11-09T15:00:00.5', precise=1))
+
+  def testToEpochBatchMicroseconds(self):
+    values = formattime.ToEpochBatch(['1970-01-01T00:00:01.000002Z'])[0]
+    self.assertEqual([1000002], values)
+
+  def testToRFC3339(self):
+    self.assertEqual('1937-01-01T12:00:27.870+00:20',
+                     formattime.ToRFC3339('1937-01-01T12:00:27.87+00:20'))
+    self.assertEqual('1997-07-01T23:59:59.000001-08:00',
+                     formattime.ToRFC3339('1997-07-01T23:59:59.000001-08:00'))
+    self.assertEqual('1997-07-01T23:59:59.000Z',
+                     formattime.ToRFC3339('1997-07-01T23:59:59'))
+
+  def testToUTCDateutilOffset(self):
+    old_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/Los_Angeles'
+    time.tzset()
+    try:
+      self.assertEqual('2008-04-01T08:00:00.000Z',
+                       formattime.ToUTC('2008-04-01T10:00:00+0200'))
+      self.assertEqual('2008-04-01T10:00:00.000Z',
+                       formattime.ToUTC('Tue, 01 Apr 2008 10:00:00 GMT'))
+      self.assertEqual('2008-04-01T08:00:00.500Z',
+                       formattime.ToRFC3339('2008-04-01 10:00:00.5+02:00'))
+      self.assertEqual('2008-04-01T17:00:00.000Z',
+                       formattime.ToUTC('2008-04-01 10:00:00'))
+    finally:
+      if old_tz is None:
+        del os.environ['TZ']
+      else:
+        os.environ['TZ'] = old_tz
+      time.tzset()
+
+  def testToRFC3339TrailingNewline(self):
+    self.assertEqual('2008-03-30T10:00:00.000Z',
+                     formattime.ToRFC3339('2008-03-30T10:00:00Z\n'))
+    self.assertEqual(None, formattime._SplitFullTime('2008-03-30T10:00:00Z\n'))
+    self.assertEqual(None, formattime._FastParse('20080330\n'))
+
+  def testToRFC3339Idempotent(self):
+    for time_str in ('1937-01-01T12:00:27.87+00:20', '2000-02-29T00:00:00Z',
+                     '2007-11-09T07:00:00.123456-08:00'):
+      normalized = formattime.ToRFC3339(time_str)
+      self.assertEqual(normalized, formattime.ToRFC3339(normalized))
+
+  def testToRFC3339NotWellFormatted(self):
+    self.assertEqual(formattime.ToUTC(r'2008\04\01'),
+                     formattime.ToRFC3339(r'2008\04\01'))
+    self.assertEqual(False, formattime._ValidDate(1900, 2, 29))
+    self.assertEqual(False, formattime._ValidDate(2007, 2, 30))
+
+  def testSlowInputCapture(self):
+    formattime.EnableSlowInputCapture(0, size=2)
+    try:
+      formattime.ToUTC('2007-11-09T07:00:00Z')
+      formattime.ToLocal('2007-11-09T07:00:00Z')
+      formattime.ToUTC(r'2008\04\01')
+      self.assertRaises(ValueError, formattime.ToUTC, 'foo bar')
+    finally:
+      formattime.DisableSlowInputCapture()
+    formattime.ToUTC('now')
+    slow = formattime.GetSlowInputs()
+    self.assertEqual([(r'2008\04\01', 'utc', 'date'),
+                      ('foo bar', 'utc', 'handle')],
+                     [(t, f, p) for t, f, secs, p in slow])
+
+  def testSlowInputCaptureCopiesBuffers(self):
+    data = bytearray('2007-11-09T07:00:00Z')
+    formattime.EnableSlowInputCapture(0)
+    try:
+      formattime.ToUTC(data)
+      formattime.ToUTC(memoryview(data)[:10])
+    finally:
+      formattime.DisableSlowInputCapture()
+    data[:4] = 'xxxx'
+    self.assertEqual(['2007-11-09T07:00:00Z', '2007-11-09'],
+                     [t for t, f, secs, p in formattime.GetSlowInputs()])
+
+  def testSlowInputCapturePaths(self):
+    formattime.EnableSlowInputCapture(0)
+    try:
+      formattime.ToUTC('2007-11-09T07:00:00Z')
+      formattime.ToLocal('2007-11-09T07:00:00Z')
+      formattime.ToLocal('Mar 30, 2008')
+      formattime.ToUTCStrict('foo bar')
+    finally:
+      formattime.DisableSlowInputCapture()
+    self.assertEqual(['fast', 'iso8601', 'names', 'classify'],
+                     [p for t, f, secs, p in formattime.GetSlowInputs()])
+
+  def testSlowInputCaptureThreads(self):
+    paths = {'2007-11-09T07:00:00Z': 'fast', '+1d': 'handle'}
+    def Convert(time_str):
+      for i in range(300):
+        formattime.ToUTC(time_str)
+    threads = [threading.Thread(target=Convert, args=(time_str,))
+               for time_str in paths]
+    formattime.EnableSlowInputCapture(0, size=1000)
+    try:
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    finally:
+      formattime.DisableSlowInputCapture()
+    slow = formattime.GetSlowInputs()
+    self.assertEqual(600, len(slow))
+    for time_str, format, secs, path in slow:
+      self.assertEqual(paths[time_str], path)
+
+  def testProfile(self):
+    if formattime.cProfile is None:
+      return
+    profile = formattime.Profile()
+    profile.Start()
+    formattime.ToUTCBatch(['2007-11-09T07:00:00Z', '+1d'])
+    profile.Stop()
+    stream = StringIO.StringIO()
+    profile.Report(stream)
+    self.assertTrue('_HandleTime' in stream.getvalue())
+
+  def testFactorize(self):
+    uniques, inverse = formattime._Factorize(['b', 'a', bytearray('b'), 'a'])
+    self.assertEqual(['b', 'a'], uniques)
+    self.assertEqual([0, 1, 0, 1], list(inverse))
+
+  def testToUTCBatchUnique(self):
+    time_strs = ['2007-11-09T07:00:00Z', r'2008\04\01', 'foo bar'] * 3
+    self.assertEqual(formattime.ToUTCBatch(time_strs),
+                     formattime.ToUTCBatch(time_strs, unique=1))
+
+  def testToUTCBatchUniqueConvertsOnce(self):
+    formattime.EnableSlowInputCapture(0)
+    try:
+      formattime.ToUTCBatch(['2007-11-09T07:00:00Z'] * 5 + ['foo bar'],
+                            unique=1)
+    finally:
+      formattime.DisableSlowInputCapture()
+    self.assertEqual(2, len(formattime.GetSlowInputs()))
+
+  def testToEpochBatchUnique(self):
+    time_strs = ['1970-01-01T00:00:01Z', 'foo bar'] * 5
+    self.assertEqual(formattime.ToEpochBatch(time_strs),
+                     formattime.ToEpochBatch(time_strs, unique=1))
+
+  def testToUTCBatchUniqueNumpy(self):
+    if formattime.numpy is None:
+      return
+    time_strs = formattime.numpy.array(['1970-01-01T00:00:01Z', 'foo bar'] * 3)
+    self.assertEqual(formattime.ToUTCBatch(list(time_strs)),
+                     formattime.ToUTCBatch(time_strs, unique=1))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -35,4 +35,4 @@ setup(name='formattime',
     keywords=['date', 'time', 'datetime', 'strftime', 'Python', 'formattime'],
     author = 'Yongjian (Jim) Xu',
     author_email = 'i3dmaster@gmail.com',
-    py_modules=['formattime', 'formattime_test'],)
+    py_modules=['formattime', 'formattime_test', 'formattime_bench'],)